@@ -1,15 +1,33 @@
 """Synchronize Standard Ebooks catalog with local EPUB collection."""
 
 import click
+import functools
+import json
+import os
 import requests
-import xml.etree.ElementTree as ElementTree
+import shutil
+import sys
+import tempfile
 import zipfile
 
-from dataclasses import dataclass
-from datetime import datetime, timezone
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import chain
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from typing import BinaryIO
 from urllib.parse import urlparse
+from urllib3.util import Retry
+
+
+try:
+    from lxml import etree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
 
 
 class Status:
@@ -55,6 +73,7 @@ class RemoteEbook:
     author: str
     href: str
     updated: datetime
+    size: int | None = None
 
 
 @dataclass
@@ -65,6 +84,8 @@ class LocalEbook:
     title: str
     path: Path
     modified: datetime
+    file_modified: datetime
+    file_size: int
 
 
 # map type selection to link title in OPDS catalog
@@ -75,125 +96,397 @@ type_selector = {
 }
 
 
-local_ebooks: list[LocalEbook] = []
+# element paths in OPDS catalog entries, in namespace-resolved form
+opds_paths = {
+    "entry": "{http://www.w3.org/2005/Atom}entry",
+    "identifier": "{http://purl.org/dc/terms/}identifier",
+    "title": "{http://www.w3.org/2005/Atom}title",
+    "author": "{http://www.w3.org/2005/Atom}author/{http://www.w3.org/2005/Atom}name",
+    "link": ".//{http://www.w3.org/2005/Atom}link",
+    "updated": "{http://www.w3.org/2005/Atom}updated",
+}
+
+
+# usual package document locations: Standard Ebooks, then other producers
+conventional_rootfiles = ("epub/content.opf", "OEBPS/content.opf")
+
+
+# element paths in EPUB container and package documents, in namespace-resolved form
+epub_paths = {
+    "rootfile": ".//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile",
+    "metadata": "{http://www.idpf.org/2007/opf}metadata",
+    "identifier": "{http://purl.org/dc/elements/1.1/}identifier",
+    "title": ".//{http://purl.org/dc/elements/1.1/}title",
+    "modified": ".//{http://www.idpf.org/2007/opf}meta[@property='dcterms:modified']",
+}
+
+
+# name suffixes that follow an author's last name
+author_suffixes = frozenset({"Jr.", "Sr.", "Esq.", "PhD"})
+
+
+# characters to replace in ebook file names
+filename_translation = str.maketrans(
+    {"/": "-", "‘": "'", "’": "'", '"': "'", "“": "'", "”": "'"}
+)
+
+
+# maximum age of cached OPDS catalog before it is revalidated with the server
+opds_cache_ttl = timedelta(hours=1)
+
+
+# map identifier to local ebooks; the same ebook can be stored in more than one file
+local_ebooks: dict[str, list[LocalEbook]] = defaultdict(list)
 
 remote_ebooks: dict[str, RemoteEbook] = {}
 
+# status lines not yet written; written immediately to a terminal, in batches otherwise
+status_lines: list[str] = []
+status_batch_size = 1 if sys.stdout.isatty() else 256
+
+session = requests.Session()
+
+# cached OPDS catalog, including redirects of identifiers found since it was retrieved
+opds_cache: dict = {}
+
+# map local path to its queued download
+downloads: dict[Path, Future] = {}
+
+# map remote ebook href to its last known update time and content length
+content_lengths: dict[str, dict] = {}
+
 
 def echo_status(path: Path, status: str) -> None:
     if not options.quiet:
-        click.echo(f"{status} {path}")
+        status_lines.append(f"{status} {path}")
+        if len(status_lines) >= status_batch_size:
+            flush_status()
+
+
+def flush_status() -> None:
+    """Write buffered status lines to standard output."""
+    if status_lines:
+        click.echo("\n".join(status_lines))
+        status_lines.clear()
 
 
 def if_exists(path: Path) -> Path | None:
     return path if path.exists() else None
 
 
+def validate_email(ctx: click.Context, param: click.Parameter, value: str) -> str:
+    if "@" not in value:
+        raise click.BadParameter("expecting an email address")
+    return value
+
+
 def fromisoformat(text: str) -> datetime:
     """Convert RFC 3339 string into datetime; compatible with Python 3.10."""
     if not text.endswith("Z"):
         raise ValueError("expecting RFC 3339 formatted string")
-    d = datetime.fromisoformat(text.rstrip("Z"))
-    return datetime(
-        d.year, d.month, d.day, d.hour, d.minute, d.second, d.microsecond, timezone.utc
-    )
+    return datetime.fromisoformat(text[:-1]).replace(tzinfo=timezone.utc)
 
 
 def request(**kwargs):
-    """Send an HTTP request."""
+    """Send an HTTP request, reusing pooled connections."""
+    response = session.request(**kwargs)
     if options.debug:
-        click.echo(f"{kwargs['method']} {kwargs['url']}", nl=False)
-    response = requests.request(**kwargs)
-    if options.debug:
-        click.echo(f" → {response.status_code} {response.reason}")
+        click.echo(
+            f"{kwargs['method']} {kwargs['url']} → {response.status_code} {response.reason}"
+        )
     return response
 
 
-def get_remote_ebooks() -> None:
-    """Retrieve Standard Ebooks metadata for EPUBs from the OPDS catalog."""
-    ns = {"atom": "http://www.w3.org/2005/Atom", "dc": "http://purl.org/dc/terms/"}
-    response = request(
-        method="GET",
-        url=options.opds,
-        stream=True,
-        auth=HTTPBasicAuth(options.email, ""),
-    )
-    response.raw.decode_content = True
-    root = ElementTree.parse(response.raw).getroot()
-    for entry in root.iterfind(".//atom:entry", ns):
+def cache_path(name: str) -> Path:
+    """Return the path of the named file in the sebsync cache directory."""
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "sebsync" / name
+
+
+def load_cache(name: str) -> dict:
+    """Load the named cache file; return an empty cache if disabled, missing or unreadable."""
+    if not options.cache:
+        return {}
+    try:
+        with cache_path(name).open() as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(name: str, cache: dict) -> None:
+    """Save the named cache file, replacing any existing file atomically."""
+    if not options.cache:
+        return
+    path = cache_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # unique temporary file, so concurrent runs cannot write into the same file
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, delete=False) as file:
+        try:
+            json.dump(cache, file)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+
+
+def iterparse(response: requests.Response) -> Iterator[tuple]:
+    """Parse XML response incrementally, yielding start and end events as content arrives."""
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def parse_remote_ebooks(response: requests.Response) -> None:
+    """Parse Standard Ebooks metadata for EPUBs from an OPDS catalog response."""
+    link_title = type_selector[options.type]
+    root = None
+    for event, entry in iterparse(response):
+        if root is None:
+            root = entry
+        if event != "end" or entry.tag != opds_paths["entry"]:
+            continue
+        links = entry.iterfind(opds_paths["link"])
+        link = next((link for link in links if link.get("title") == link_title), None)
         remote_ebook = RemoteEbook(
-            id=entry.find("dc:identifier", ns).text,
-            title=entry.find("atom:title", ns).text,
-            author=entry.find("atom:author", ns).find("atom:name", ns).text,
-            href=entry.find(f".//atom:link[@title='{type_selector[options.type]}']", ns).attrib[
-                "href"
-            ],
-            updated=fromisoformat(entry.find("atom:updated", ns).text),
+            id=entry.find(opds_paths["identifier"]).text,
+            title=entry.find(opds_paths["title"]).text,
+            author=entry.find(opds_paths["author"]).text,
+            href=link.attrib["href"],
+            updated=fromisoformat(entry.find(opds_paths["updated"]).text),
+            size=int(link.attrib["length"]) if "length" in link.attrib else None,
         )
         remote_ebooks[remote_ebook.id] = remote_ebook
+        root.clear()  # release consumed entries
+
+
+def get_remote_ebooks() -> None:
+    """Retrieve Standard Ebooks metadata for EPUBs from the OPDS catalog or its cache."""
+    cache = load_cache("opds.json")
+    if cache.get("opds") != options.opds or cache.get("type") != options.type:
+        cache = {}
+    now = datetime.now(timezone.utc)
+    if not cache or now - datetime.fromisoformat(cache["fetched"]) > opds_cache_ttl:
+        headers = {}
+        if cache.get("etag"):
+            headers["If-None-Match"] = cache["etag"]
+        if cache.get("last_modified"):
+            headers["If-Modified-Since"] = cache["last_modified"]
+        response = request(
+            method="GET",
+            url=options.opds,
+            stream=True,
+            auth=HTTPBasicAuth(options.email, ""),
+            headers=headers,
+        )
+        if response.status_code != 304:  # not modified
+            parse_remote_ebooks(response)
+            cache = {
+                "opds": options.opds,
+                "type": options.type,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "ebooks": [
+                    {**asdict(ebook), "updated": ebook.updated.isoformat()}
+                    for ebook in remote_ebooks.values()
+                ],
+            }
+        if remote_ebooks or response.status_code == 304:
+            cache["fetched"] = now.isoformat()
+            save_cache("opds.json", cache)
+    if not remote_ebooks:
+        for ebook in cache.get("ebooks", []):
+            updated = datetime.fromisoformat(ebook["updated"])
+            remote_ebooks[ebook["id"]] = RemoteEbook(**{**ebook, "updated": updated})
     if not remote_ebooks:
         raise click.ClickException("OPDS catalog download failed. Is email address correct?")
+    opds_cache.update(cache)
+    opds_cache.setdefault("redirects", {})
     if options.verbose:
         click.echo(f"Found {len(remote_ebooks)} remote ebooks.")
 
 
+def get_local_ebook_metadata(path: Path, stat: os.stat_result) -> LocalEbook | None:
+    """Return metadata of the Standard EPUB at the specified path, or None if not one."""
+    with zipfile.ZipFile(path) as zip:
+        # try conventional package document locations before consulting the container
+        for rootfile in conventional_rootfiles:
+            try:
+                package = zip.open(rootfile)
+                break
+            except KeyError:
+                continue
+        else:
+            with zip.open("META-INF/container.xml") as file:
+                root = ElementTree.parse(file)
+                rootfile = root.find(epub_paths["rootfile"]).attrib["full-path"]
+            package = zip.open(rootfile)
+        with package as file:
+            root = ElementTree.parse(file)
+            metadata = root.find(epub_paths["metadata"])
+            id = metadata.find(epub_paths["identifier"])
+            if id is None or "standardebooks.org" not in id.text:
+                return None
+            modified = metadata.find(epub_paths["modified"])
+            return LocalEbook(
+                id=id.text,
+                title=metadata.find(epub_paths["title"]).text,
+                path=path,
+                modified=fromisoformat(modified.text),
+                file_modified=datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                file_size=stat.st_size,
+            )
+
+
+def get_cached_local_ebook_metadata(
+    path: Path, cached: dict | None
+) -> tuple[os.stat_result, LocalEbook | None]:
+    """Return file status and metadata of local EPUB; cached metadata is used if unchanged."""
+    stat = path.stat()
+    if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+        if cached["id"] is None:
+            return stat, None
+        return stat, LocalEbook(
+            id=cached["id"],
+            title=cached["title"],
+            path=path,
+            modified=datetime.fromisoformat(cached["modified"]),
+            file_modified=datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            file_size=stat.st_size,
+        )
+    return stat, get_local_ebook_metadata(path, stat)
+
+
+def find_epubs(directory: Path) -> Iterator[Path]:
+    """Yield paths of EPUB files in the specified directory and its subdirectories."""
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return  # skip unreadable directory, like Path.glob
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from find_epubs(Path(entry.path))
+            elif os.path.normcase(entry.name).endswith(".epub") and entry.is_file():
+                yield Path(entry.path)
+
+
 def get_local_ebooks() -> None:
     """Retrieve metadata of Standard EPUBs in the specified directory and subdirectories."""
-    for path in options.books.glob("**/*.epub"):
-        if not path.is_file():
-            continue
-        try:
-            with zipfile.ZipFile(path) as zip:
-                with zip.open("META-INF/container.xml") as file:
-                    root = ElementTree.parse(file)
-                    ns = {"container": "urn:oasis:names:tc:opendocument:xmlns:container"}
-                    rootfile = root.find(".//container:rootfile", ns).attrib["full-path"]
-                with zip.open(rootfile) as file:
-                    root = ElementTree.parse(file)
-                    ns = {
-                        "opf": "http://www.idpf.org/2007/opf",
-                        "dc": "http://purl.org/dc/elements/1.1/",
-                    }
-                    metadata = root.find("opf:metadata", ns)
-                    id = metadata.find("dc:identifier", ns)
-                    if id is None or "standardebooks.org" not in id.text:
-                        continue
-                    modified = metadata.find(".//opf:meta[@property='dcterms:modified']", ns)
-                    local_ebook = LocalEbook(
-                        id=id.text,
-                        title=metadata.find(".//dc:title", ns).text,
-                        path=path,
-                        modified=fromisoformat(modified.text),
-                    )
-                    local_ebooks.append(local_ebook)
-        except Exception:
-            echo_status(path, Status.UNKNOWN)
+    cache = load_cache("local_ebooks.json")
+    scanned = {}
+    paths = list(find_epubs(options.books))
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        futures = [
+            executor.submit(get_cached_local_ebook_metadata, path, cache.get(str(path)))
+            for path in paths
+        ]
+        for path, future in zip(paths, futures):
+            try:
+                stat, local_ebook = future.result()
+            except Exception:
+                echo_status(path, Status.UNKNOWN)
+                continue
+            scanned[str(path)] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "id": local_ebook.id if local_ebook else None,
+                "title": local_ebook.title if local_ebook else None,
+                "modified": local_ebook.modified.isoformat() if local_ebook else None,
+            }
+            if local_ebook:
+                local_ebooks[local_ebook.id].append(local_ebook)
+    save_cache("local_ebooks.json", scanned)
+    flush_status()
     if options.verbose:
-        click.echo(f"Found {len(local_ebooks)} local ebooks.")
+        click.echo(f"Found {sum(map(len, local_ebooks.values()))} local ebooks.")
 
 
-def download_ebook(url: str, path: Path, status: str) -> None:
-    """Download the ebook at the specified URL into the specified path."""
-    echo_status(path, status)
-    if options.dry_run:
+def preallocate(file: BinaryIO, response: requests.Response) -> None:
+    """Reserve space on disk for response content, if its length is known in advance."""
+    if not hasattr(os, "posix_fallocate") or "Content-Encoding" in response.headers:
         return
+    try:
+        os.posix_fallocate(file.fileno(), 0, int(response.headers["Content-Length"]))
+    except (KeyError, ValueError, OSError):
+        pass  # preallocation is only an optimization
+
+
+def partial_download(
+    ebook: RemoteEbook, download: Path, validator: Path
+) -> tuple[int, str] | None:
+    """Return size and If-Range validator of partial download of the remote ebook, if any."""
+    try:
+        with validator.open() as file:
+            partial = json.load(file)
+        size = download.stat().st_size
+    except (OSError, ValueError):
+        return None
+    if partial.get("href") != ebook.href or not partial.get("if_range"):
+        return None  # partial download of another resource, or cannot be validated
+    return size, partial["if_range"]
+
+
+def download_ebook(ebook: RemoteEbook, path: Path) -> None:
+    """Download the remote ebook into the specified path, resuming any partial download."""
     download = path.with_suffix(".sebsync")
-    response = request(method="GET", url=url, stream=True)
-    with download.open("wb") as file:
-        for chunk in response.iter_content(chunk_size=1 * 1024 * 1024):
-            file.write(chunk)
+    validator = path.with_suffix(".sebsync.json")  # identifies resource of partial download
+    headers = {"Accept-Encoding": "identity"}  # EPUBs are already compressed
+    partial = partial_download(ebook, download, validator)
+    if partial:  # resume only if resource is unchanged since partially downloaded
+        headers["Range"] = f"bytes={partial[0]}-"
+        headers["If-Range"] = partial[1]
+    with request(method="GET", url=ebook.href, stream=True, headers=headers) as response:
+        resume = False
+        if partial and response.status_code in (206, 416):  # partial content, unsatisfiable
+            if not response.headers.get("Content-Range", "").startswith(f"bytes {partial[0]}-"):
+                download.unlink()  # content does not continue partial download; start over
+                validator.unlink()
+                return download_ebook(ebook, path)
+            resume = True
+        if not resume:  # If-Range requires a strong validator
+            etag = response.headers.get("ETag", "")
+            if_range = etag if etag.startswith('"') else response.headers.get("Last-Modified")
+            with validator.open("w") as file:
+                json.dump({"href": ebook.href, "if_range": if_range}, file)
+        with download.open("ab" if resume else "wb") as file:
+            if not resume:
+                preallocate(file, response)
+            response.raw.decode_content = True
+            try:
+                # copy in small pieces, so received content is kept if interrupted
+                shutil.copyfileobj(response.raw, file, length=64 * 1024)
+            finally:
+                file.truncate()  # discard preallocated space not received
     download.replace(path)
+    validator.unlink(missing_ok=True)
+    content_lengths[ebook.href] = {
+        "updated": ebook.updated.isoformat(),
+        "length": path.stat().st_size,
+    }
+
+
+def queue_download(executor: Executor, ebook: RemoteEbook, path: Path, status: str) -> None:
+    """Queue the remote ebook to be downloaded into the specified path."""
+    echo_status(path, status)
+    if options.dry_run:
+        return
+    if path in downloads:  # wait for earlier download into the same path
+        downloads[path].result()
+    downloads[path] = executor.submit(download_ebook, ebook, path)
 
 
+@functools.cache
 def sortable_author(author: str) -> str:
     """Return the sortable name of the given author."""
-    suffixes = {"Jr.", "Sr.", "Esq.", "PhD"}
     split = author.split()
     if len(split) < 2:
         return author
     last = split.pop().rstrip(",")
     suffix = None
-    if last in suffixes:
+    if last in author_suffixes:
         suffix = last
         last = split.pop()
     result = last
@@ -207,19 +500,27 @@ def sortable_author(author: str) -> str:
 def books_are_different(local_ebook: LocalEbook, remote_ebook: RemoteEbook) -> bool:
     """Return if differences are detected between local and remote ebooks."""
 
-    # if metadata has exact modification times, then local is considered current
-    if remote_ebook.updated == local_ebook.modified:
+    # if metadata modification time is not older than remote, then local is considered current
+    if local_ebook.modified >= remote_ebook.updated:
         return False
 
-    stat = local_ebook.path.stat()
-
-    file_modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
-    if remote_ebook.updated > file_modified:
+    if remote_ebook.updated > local_ebook.file_modified:
         return True
 
-    response = request(method="HEAD", url=remote_ebook.href)
-    content_length = int(response.headers["Content-Length"])
-    if content_length != stat.st_size:
+    # content length of the remote ebook is known if in catalog or not updated since last seen
+    cached = content_lengths.get(remote_ebook.href)
+    if remote_ebook.size is not None:
+        content_length = remote_ebook.size
+    elif cached and cached["updated"] == remote_ebook.updated.isoformat():
+        content_length = cached["length"]
+    else:
+        response = request(method="HEAD", url=remote_ebook.href)
+        content_length = int(response.headers["Content-Length"])
+        content_lengths[remote_ebook.href] = {
+            "updated": remote_ebook.updated.isoformat(),
+            "length": content_length,
+        }
+    if content_length != local_ebook.file_size:
         return True
 
     return False
@@ -227,25 +528,26 @@ def books_are_different(local_ebook: LocalEbook, remote_ebook: RemoteEbook) -> b
 
 def ebook_filename(ebook: RemoteEbook) -> str:
     """Return an EPUB file name for remote ebook."""
-    replace = {"/": "-", "‘": "'", "’": "'", '"': "'", "“": "'", "”": "'"}
     match options.naming:
         case "standard":
             result = Path(urlparse(ebook.href).path).name
         case "sortable":
             result = f"{sortable_author(ebook.author)} - {ebook.title}.epub"
-    for k, v in replace.items():
-        result = result.replace(k, v)
-    return result
+    return result.translate(filename_translation)
 
 
 def is_deprecated(local_ebook: LocalEbook) -> bool:
     """Return if the specified book identifier is deprecated."""
     if not local_ebook.id.startswith("url:"):
         raise ValueError("expect identifier to begin with 'url:'")
-    response = request(method="HEAD", url=local_ebook.id[4:], allow_redirects=False)
-    return (
-        response.status_code == 301 and f"url:{response.headers['Location']}" in remote_ebooks
-    )
+    redirects = opds_cache["redirects"]
+    if local_ebook.id not in redirects:
+        response = request(method="HEAD", url=local_ebook.id[4:], allow_redirects=False)
+        redirects[local_ebook.id] = (
+            response.headers["Location"] if response.status_code == 301 else None
+        )
+    location = redirects[local_ebook.id]
+    return location is not None and f"url:{location}" in remote_ebooks
 
 
 def remove(local_ebook: LocalEbook) -> None:
@@ -260,11 +562,13 @@ class Options:
     """Command line options."""
 
     books: Path
+    cache: bool
     debug: bool
     downloads: Path
     dry_run: bool
     email: str
     force_update: bool
+    jobs: int
     naming: str
     opds: str
     quiet: bool
@@ -284,6 +588,11 @@ options: Options = None
     type=click.Path(exists=True, file_okay=False, dir_okay=True, writable=True, path_type=Path),
     default=if_exists(Path.home() / "Books"),
 )
+@click.option(
+    "--cache/--no-cache",
+    help="Cache catalog metadata between runs.",
+    default=True,
+)
 @click.option(
     "--debug",
     is_flag=True,
@@ -304,6 +613,7 @@ options: Options = None
     "--email",
     help="Email address to authenticate with Standard Ebooks.",
     required=True,
+    callback=validate_email,
 )
 @click.option(
     "--force-update",
@@ -311,6 +621,12 @@ options: Options = None
     is_flag=True,
 )
 @click.help_option()
+@click.option(
+    "--jobs",
+    help="Maximum number of concurrent requests and downloads.",
+    type=click.IntRange(min=1),
+    default=5,
+)
 @click.option(
     "--naming",
     type=click.Choice(["standard", "sortable"]),
@@ -361,43 +677,93 @@ def sebsync(**kwargs):
     # --quiet wins over --verbose
     options.verbose = options.verbose and not options.quiet
 
+    # write any buffered status lines, even if synchronization fails
+    click.get_current_context().call_on_close(flush_status)
+
+    # keep a connection per concurrent request; retry when rate limited or unavailable
+    adapter = HTTPAdapter(
+        pool_maxsize=options.jobs,
+        max_retries=Retry(
+            total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
     get_remote_ebooks()
     get_local_ebooks()
+    content_lengths.update(load_cache("content_lengths.json"))
 
-    for remote_ebook in remote_ebooks.values():
-        matching_local_ebooks = [b for b in local_ebooks if b.id == remote_ebook.id]
-        download_new = True
-        if matching_local_ebooks:
-            for local_ebook in matching_local_ebooks:
-                if options.update:
-                    download_new = False
-                    if options.force_update or books_are_different(local_ebook, remote_ebook):
-                        download_ebook(remote_ebook.href, local_ebook.path, Status.UPDATE)
-                    elif options.verbose:
-                        echo_status(local_ebook.path, Status.CURRENT)
-                else:
-                    if books_are_different(local_ebook, remote_ebook):
-                        if options.remove:
-                            remove(local_ebook)
+    with ThreadPoolExecutor(max_workers=options.jobs) as executor:
+        try:
+            # probe local ebooks concurrently, as each probe can require a request
+            differences = {
+                local_ebook.path: executor.submit(
+                    books_are_different, local_ebook, remote_ebooks[local_ebook.id]
+                )
+                for local_ebook in chain.from_iterable(local_ebooks.values())
+                if local_ebook.id in remote_ebooks and not options.force_update
+            }
+            unlisted_ebooks = [
+                local_ebook
+                for ebook_id, matching_local_ebooks in local_ebooks.items()
+                if ebook_id not in remote_ebooks
+                for local_ebook in matching_local_ebooks
+            ]
+            deprecations = {
+                local_ebook.path: executor.submit(is_deprecated, local_ebook)
+                for local_ebook in unlisted_ebooks
+            }
+
+            for remote_ebook in remote_ebooks.values():
+                matching_local_ebooks = local_ebooks.get(remote_ebook.id, [])
+                download_new = True
+                if matching_local_ebooks:
+                    for local_ebook in matching_local_ebooks:
+                        if options.update:
+                            download_new = False
+                            if options.force_update or differences[local_ebook.path].result():
+                                queue_download(
+                                    executor, remote_ebook, local_ebook.path, Status.UPDATE
+                                )
+                            elif options.verbose:
+                                echo_status(local_ebook.path, Status.CURRENT)
                         else:
-                            echo_status(local_ebook.path, Status.OUTDATED)
+                            if differences[local_ebook.path].result():
+                                if options.remove:
+                                    remove(local_ebook)
+                                else:
+                                    echo_status(local_ebook.path, Status.OUTDATED)
+                            else:
+                                download_new = False  # at least one local ebook already matches
+                                if options.verbose:
+                                    echo_status(local_ebook.path, Status.CURRENT)
+                if download_new:
+                    path = options.downloads / ebook_filename(remote_ebook)
+                    queue_download(executor, remote_ebook, path, Status.NEW)
+
+            for local_ebook in unlisted_ebooks:
+                if deprecations[local_ebook.path].result():
+                    if options.remove:
+                        remove(local_ebook)
                     else:
-                        download_new = False  # at least one local ebook already matches
-                        if options.verbose:
-                            echo_status(local_ebook.path, Status.CURRENT)
-        if download_new:
-            path = options.downloads / ebook_filename(remote_ebook)
-            download_ebook(remote_ebook.href, path, Status.NEW)
-
-    for local_ebook in local_ebooks:
-        if local_ebook.id not in remote_ebooks:
-            if is_deprecated(local_ebook):
-                if options.remove:
-                    remove(local_ebook)
+                        echo_status(local_ebook.path, Status.OUTDATED)
                 else:
-                    echo_status(local_ebook.path, Status.OUTDATED)
-            else:
-                echo_status(local_ebook.path, Status.EXTRA)
+                    echo_status(local_ebook.path, Status.EXTRA)
+
+            for download in downloads.values():
+                download.result()  # raise any download error
+        except BaseException:
+            # cancel queued downloads; only those in progress are finished
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    save_cache("opds.json", opds_cache)
+    hrefs = {remote_ebook.href for remote_ebook in remote_ebooks.values()}
+    save_cache(
+        "content_lengths.json",
+        {href: cached for href, cached in content_lengths.items() if href in hrefs},
+    )
 
 
 def main():
@@ -0,0 +1,88 @@
+import pytest
+import sebsync
+import threading
+import urllib3
+
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+content = bytes(range(256)) * 1200  # 300 KiB
+cut = 200_000  # bytes sent before an interrupted transfer is dropped
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        etag = f'"{self.path}"'
+        start = 0
+        range = self.headers.get("Range")
+        if range and self.headers.get("If-Range") == etag:
+            start = int(range.removeprefix("bytes=").removesuffix("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        if self.server.interrupt:
+            self.server.interrupt = False
+            self.wfile.write(content[start:cut])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(sebsync, "options", SimpleNamespace(debug=False))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    server.interrupt = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def ebook(server, name):
+    return sebsync.RemoteEbook(
+        id=name,
+        title=name,
+        author="Author",
+        href=f"http://127.0.0.1:{server.server_port}/{name}.epub",
+        updated=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+
+
+def test_download_interrupted_is_resumed(server, tmp_path):
+    path = tmp_path / "book.epub"
+    server.interrupt = True
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        sebsync.download_ebook(ebook(server, "compatible"), path)
+    size = path.with_suffix(".sebsync").stat().st_size
+    assert cut - 64 * 1024 < size <= cut  # received content is kept
+    sebsync.download_ebook(ebook(server, "compatible"), path)
+    assert server.requests[-1]["Range"] == f"bytes={size}-"
+    assert path.read_bytes() == content
+    assert not path.with_suffix(".sebsync").exists()
+    assert not path.with_suffix(".sebsync.json").exists()
+
+
+def test_download_of_other_resource_is_not_resumed(server, tmp_path):
+    path = tmp_path / "book.epub"
+    server.interrupt = True
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        sebsync.download_ebook(ebook(server, "compatible"), path)
+    sebsync.download_ebook(ebook(server, "advanced"), path)
+    assert "Range" not in server.requests[-1]
+    assert path.read_bytes() == content